@@ -2,6 +2,19 @@ import sqlite3
 from datetime import datetime
 from pathlib import Path
 
+# Indexes backing the MCP server's hot queries (customer listing by status
+# and ticket history per customer). mcp_server.py also applies these to
+# existing databases on startup.
+QUERY_INDEX_DDL = (
+    # Superseded by idx_tickets_customer_created, which starts with the
+    # same column; keeping both only slows down ticket inserts.
+    "DROP INDEX IF EXISTS idx_tickets_customer_id",
+    "CREATE INDEX IF NOT EXISTS idx_customers_status_created "
+    "ON customers(status, created_at DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_tickets_customer_created "
+    "ON tickets(customer_id, created_at DESC)",
+)
+
 
 class DatabaseSetup:
     """SQLite database setup for customer support system."""
@@ -57,14 +70,13 @@ class DatabaseSetup:
             CREATE INDEX IF NOT EXISTS idx_customers_email ON customers(email)
         """)
 
-        self.cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_tickets_customer_id ON tickets(customer_id)
-        """)
-
         self.cursor.execute("""
             CREATE INDEX IF NOT EXISTS idx_tickets_status ON tickets(status)
         """)
 
+        for sql in QUERY_INDEX_DDL:
+            self.cursor.execute(sql)
+
         self.conn.commit()
         print("Tables created successfully!")
 
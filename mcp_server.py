@@ -8,117 +8,277 @@ Implements:
 Backed by SQLite database "support.db" created by database_setup.py.
 """
 
-from typing import Any, Dict, List, Callable, Optional
+from contextlib import asynccontextmanager, contextmanager
+from itertools import combinations
+from typing import Any, Dict, Iterator, List, Callable, Optional
 
-import json
+import queue
 import sqlite3
+import threading
 
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
+import fastjsonschema
+from cachetools import TTLCache
+import orjson
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+
+from database_setup import QUERY_INDEX_DDL
 
 DB_PATH = "support.db"
 
+# Connections are reused across requests instead of being opened per call.
+# Tool calls run in anyio's threadpool (40 threads by default), so that is
+# how many connections can be in use at once; the pool keeps that many
+# idle so no concurrent call falls back to opening a fresh connection.
+POOL_SIZE = 40
+
 # =====================================================
 # Database helper functions (MCP tool implementations)
 # =====================================================
 
 def get_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    # Applied once per connection; pooled connections keep these settings.
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -64000")  # ~64 MB
+    conn.execute("PRAGMA mmap_size = 268435456")  # 256 MB
+    conn.execute("PRAGMA foreign_keys = ON")
     return conn
 
 
-def get_customer(customer_id: int) -> Dict[str, Any]:
-    conn = get_connection()
+_pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=POOL_SIZE)
+
+
+@contextmanager
+def get_conn() -> Iterator[sqlite3.Connection]:
+    """
+    Borrow a pooled connection for the duration of the block.
+
+    Connections are created lazily and returned to the pool afterwards.
+    If the pool is already full the connection is simply closed.
+    """
     try:
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM customers WHERE id = ?", (customer_id,))
-        row = cur.fetchone()
-        return dict(row) if row else {}
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = get_connection()
+    try:
+        yield conn
     finally:
-        conn.close()
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            _pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+
+# Rows are fetched as plain tuples and zipped with these keys, which is
+# cheaper than going through sqlite3.Row.
+CUSTOMER_KEYS = ("id", "name", "email", "phone", "status", "created_at", "updated_at")
+TICKET_KEYS = ("id", "customer_id", "issue", "status", "priority", "created_at")
+CUSTOMER_COLS = ", ".join(CUSTOMER_KEYS)
+TICKET_COLS = ", ".join(TICKET_KEYS)
+
+# SQL text is kept constant so sqlite3's per-connection statement cache
+# can reuse the prepared statement across requests.
+SELECT_CUSTOMER_SQL = f"SELECT {CUSTOMER_COLS} FROM customers WHERE id = ?"
+LIST_CUSTOMERS_SQL = (
+    f"SELECT {CUSTOMER_COLS} FROM customers WHERE status = ? "
+    "ORDER BY created_at DESC LIMIT ?"
+)
+INSERT_TICKET_SQL = (
+    "INSERT INTO tickets (customer_id, issue, status, priority, created_at) "
+    f"VALUES (?, ?, 'open', ?, CURRENT_TIMESTAMP) RETURNING {TICKET_COLS}"
+)
+INSERT_TICKETS_SQL = (
+    "INSERT INTO tickets (customer_id, issue, status, priority, created_at) "
+    "VALUES (?, ?, 'open', ?, CURRENT_TIMESTAMP)"
+)
+
+# Customer row plus all of their tickets in one statement; SQLite builds
+# the ticket list as a JSON array. The derived table's ORDER BY is not
+# guaranteed to survive json_group_array (an ORDER BY inside the aggregate
+# needs SQLite 3.44+), so get_customer_history re-sorts the decoded list.
+SELECT_CUSTOMER_HISTORY_SQL = (
+    f"SELECT {CUSTOMER_COLS}, "
+    "(SELECT COALESCE(json_group_array(json_object("
+    + ", ".join(f"'{k}', t.{k}" for k in TICKET_KEYS)
+    + f")), '[]') FROM (SELECT {TICKET_COLS} FROM tickets "
+    "WHERE customer_id = customers.id ORDER BY created_at DESC) AS t) "
+    "FROM customers WHERE id = ?"
+)
+
+# Kept in a fixed order so that any subset picked out of it is already
+# a valid key into UPDATE_CUSTOMER_SQL.
+UPDATABLE_CUSTOMER_FIELDS = ("email", "name", "phone", "status")
+
+# One UPDATE statement per non-empty subset of the updatable fields (15 in
+# total), built once so sqlite3 never sees a new statement at runtime.
+UPDATE_CUSTOMER_SQL: Dict[tuple, str] = {
+    fields: (
+        "UPDATE customers SET "
+        + ", ".join(f"{f} = ?" for f in fields)
+        + f", updated_at = CURRENT_TIMESTAMP WHERE id = ? RETURNING {CUSTOMER_COLS}"
+    )
+    for n in range(1, len(UPDATABLE_CUSTOMER_FIELDS) + 1)
+    for fields in combinations(UPDATABLE_CUSTOMER_FIELDS, n)
+}
+
+
+# Short-lived cache for the read-only tools, keyed by (tool name, args)
+# and invalidated by the tools that write to the same customer.
+_read_cache: TTLCache = TTLCache(maxsize=10_000, ttl=30)
+_read_cache_lock = threading.Lock()
+# Bumped by every invalidation of a customer. A reader records it before
+# querying and only caches its result if it is unchanged afterwards, so a
+# read that raced with a write cannot put the old row back.
+_cache_generations: Dict[int, int] = {}
+
+
+def _cache_key(name: str, **arguments: Any) -> tuple:
+    return (name, frozenset(arguments.items()))
+
+
+def _cache_get(key: tuple) -> Any:
+    with _read_cache_lock:
+        return _read_cache.get(key)
+
+
+def _cache_generation(customer_id: int) -> int:
+    with _read_cache_lock:
+        return _cache_generations.get(customer_id, 0)
+
+
+def _cache_set(key: tuple, value: Any, customer_id: int, generation: int) -> None:
+    with _read_cache_lock:
+        if _cache_generations.get(customer_id, 0) == generation:
+            _read_cache[key] = value
+
+
+def _invalidate(names: tuple, customer_ids) -> None:
+    with _read_cache_lock:
+        for customer_id in customer_ids:
+            _cache_generations[customer_id] = _cache_generations.get(customer_id, 0) + 1
+            for name in names:
+                _read_cache.pop(_cache_key(name, customer_id=customer_id), None)
+
+
+def _copy_history(history: Dict[str, Any]) -> Dict[str, Any]:
+    customer = history["customer"]
+    return {
+        "customer": dict(customer) if customer is not None else None,
+        "tickets": [dict(t) for t in history["tickets"]],
+    }
+
+
+def ensure_indexes() -> None:
+    with get_conn() as conn, conn:
+        for sql in QUERY_INDEX_DDL:
+            conn.execute(sql)
+
+
+def get_customer(customer_id: int) -> Dict[str, Any]:
+    # Callers get their own copy so they cannot mutate the cached entry.
+    key = _cache_key("get_customer", customer_id=customer_id)
+    cached = _cache_get(key)
+    if cached is not None:
+        return dict(cached)
+
+    generation = _cache_generation(customer_id)
+    with get_conn() as conn:
+        row = conn.execute(SELECT_CUSTOMER_SQL, (customer_id,)).fetchone()
+    result = dict(zip(CUSTOMER_KEYS, row)) if row else {}
+    _cache_set(key, result, customer_id, generation)
+    return dict(result)
 
 
 def list_customers(status: str = "active", limit: int = 20) -> List[Dict[str, Any]]:
-    conn = get_connection()
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            "SELECT * FROM customers WHERE status = ? "
-            "ORDER BY created_at DESC LIMIT ?",
-            (status, limit),
-        )
-        return [dict(r) for r in cur.fetchall()]
-    finally:
-        conn.close()
+    with get_conn() as conn:
+        rows = conn.execute(LIST_CUSTOMERS_SQL, (status, limit))
+        return [dict(zip(CUSTOMER_KEYS, r)) for r in rows]
 
 
 def update_customer(customer_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
-    allowed_fields = {"name", "email", "phone", "status"}
-    fields = [k for k in data.keys() if k in allowed_fields]
+    fields = tuple(f for f in UPDATABLE_CUSTOMER_FIELDS if f in data)
     if not fields:
         raise ValueError("No valid fields to update.")
 
-    set_clause = ", ".join(f"{f} = ?" for f in fields)
     values = [data[f] for f in fields]
 
-    conn = get_connection()
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            f"UPDATE customers SET {set_clause}, updated_at = CURRENT_TIMESTAMP "
-            "WHERE id = ?",
-            (*values, customer_id),
-        )
-        conn.commit()
-        cur.execute("SELECT * FROM customers WHERE id = ?", (customer_id,))
-        row = cur.fetchone()
-        return dict(row) if row else {}
-    finally:
-        conn.close()
+    # Write and read back in a single statement and a single transaction.
+    with get_conn() as conn, conn:
+        sql = UPDATE_CUSTOMER_SQL[fields]
+        row = conn.execute(sql, (*values, customer_id)).fetchone()
+    _invalidate(("get_customer", "get_customer_history"), (customer_id,))
+    return dict(zip(CUSTOMER_KEYS, row)) if row else {}
 
 
 def create_ticket(customer_id: int, issue: str, priority: str = "medium") -> Dict[str, Any]:
-    if priority not in {"low", "medium", "high"}:
-        raise ValueError("priority must be one of: low, medium, high")
+    with get_conn() as conn, conn:
+        row = conn.execute(INSERT_TICKET_SQL, (customer_id, issue, priority)).fetchone()
+    _invalidate(("get_customer_history",), (customer_id,))
+    return dict(zip(TICKET_KEYS, row))
 
-    conn = get_connection()
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO tickets (customer_id, issue, status, priority, created_at)
-            VALUES (?, ?, 'open', ?, CURRENT_TIMESTAMP)
-            """,
-            (customer_id, issue, priority),
-        )
-        conn.commit()
-        ticket_id = cur.lastrowid
-        cur.execute("SELECT * FROM tickets WHERE id = ?", (ticket_id,))
-        row = cur.fetchone()
-        return dict(row)
-    finally:
-        conn.close()
+
+def create_tickets(tickets: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Create many tickets in a single transaction.
+
+    Returns the number of tickets created and the range of their ids
+    instead of echoing every row back.
+    """
+    if not tickets:
+        raise ValueError("tickets must not be empty.")
+
+    rows = [
+        (t["customer_id"], t["issue"], t.get("priority", "medium"))
+        for t in tickets
+    ]
+
+    with get_conn() as conn, conn:
+        conn.executemany(INSERT_TICKETS_SQL, rows)
+        # The write lock is held for the whole batch, so the AUTOINCREMENT
+        # ids handed out are contiguous.
+        last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+    _invalidate(("get_customer_history",), {r[0] for r in rows})
+    return {
+        "count": len(rows),
+        "first_id": last_id - len(rows) + 1,
+        "last_id": last_id,
+    }
 
 
 def get_customer_history(customer_id: int) -> Dict[str, Any]:
-    conn = get_connection()
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM customers WHERE id = ?", (customer_id,))
-        cust = cur.fetchone()
-        if not cust:
-            return {"customer": None, "tickets": []}
-
-        cur.execute(
-            "SELECT * FROM tickets WHERE customer_id = ? "
-            "ORDER BY created_at DESC",
-            (customer_id,),
-        )
-        tickets = [dict(r) for r in cur.fetchall()]
-        return {"customer": dict(cust), "tickets": tickets}
-    finally:
-        conn.close()
+    key = _cache_key("get_customer_history", customer_id=customer_id)
+    cached = _cache_get(key)
+    if cached is not None:
+        return _copy_history(cached)
+
+    generation = _cache_generation(customer_id)
+    with get_conn() as conn:
+        row = conn.execute(SELECT_CUSTOMER_HISTORY_SQL, (customer_id,)).fetchone()
+    if not row:
+        result = {"customer": None, "tickets": []}
+    else:
+        tickets = orjson.loads(row[-1])
+        # Newest first. Usually already in order, so this is a linear pass.
+        tickets.sort(key=lambda t: t["created_at"], reverse=True)
+        result = {
+            "customer": dict(zip(CUSTOMER_KEYS, row)),
+            "tickets": tickets,
+        }
+    _cache_set(key, result, customer_id, generation)
+    return _copy_history(result)
+
+
+def iter_customers(status: str = "active", limit: int = 20) -> Iterator[Dict[str, Any]]:
+    """Streaming variant of list_customers: yields rows as they are fetched."""
+    with get_conn() as conn:
+        for r in conn.execute(LIST_CUSTOMERS_SQL, (status, limit)):
+            yield dict(zip(CUSTOMER_KEYS, r))
 
 
 # =====================================================
@@ -133,12 +293,18 @@ class ToolDef:
         func: Callable[..., Any],
         input_schema: Dict[str, Any],
         output_schema: Dict[str, Any],
+        stream_func: Optional[Callable[..., Iterator[Dict[str, Any]]]] = None,
     ):
         self.name = name
         self.description = description
         self.func = func
         self.input_schema = input_schema
         self.output_schema = output_schema
+        # Compiled once; returns the arguments with schema defaults applied.
+        self.validate = fastjsonschema.compile(input_schema)
+        # When set, tools/call emits one "chunk" event per yielded row
+        # instead of a single "result" event.
+        self.stream_func = stream_func
 
 
 TOOLS: Dict[str, ToolDef] = {
@@ -171,7 +337,9 @@ TOOLS: Dict[str, ToolDef] = {
             },
             "required": [],
         },
+        # Delivered over tools/call as one "chunk" event per item.
         output_schema={"type": "array", "items": {"type": "object"}},
+        stream_func=iter_customers,
     ),
     "update_customer": ToolDef(
         name="update_customer",
@@ -190,6 +358,7 @@ TOOLS: Dict[str, ToolDef] = {
                         "status": {"type": "string", "enum": ["active", "disabled"]},
                     },
                     "additionalProperties": False,
+                    "minProperties": 1,
                 },
             },
             "required": ["customer_id", "data"],
@@ -215,6 +384,35 @@ TOOLS: Dict[str, ToolDef] = {
         },
         output_schema={"type": "object"},
     ),
+    "create_tickets": ToolDef(
+        name="create_tickets",
+        description="Create several support tickets in one batch.",
+        func=create_tickets,
+        input_schema={
+            "type": "object",
+            "properties": {
+                "tickets": {
+                    "type": "array",
+                    "minItems": 1,
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "customer_id": {"type": "integer"},
+                            "issue": {"type": "string"},
+                            "priority": {
+                                "type": "string",
+                                "enum": ["low", "medium", "high"],
+                                "default": "medium",
+                            },
+                        },
+                        "required": ["customer_id", "issue"],
+                    },
+                },
+            },
+            "required": ["tickets"],
+        },
+        output_schema={"type": "object"},
+    ),
     "get_customer_history": ToolDef(
         name="get_customer_history",
         description="Get a customer and all of their tickets.",
@@ -230,12 +428,45 @@ TOOLS: Dict[str, ToolDef] = {
     ),
 }
 
+# Per-tool start/end frames of the tools/call stream never change.
+START_FRAMES: Dict[str, bytes] = {
+    name: orjson.dumps({"event": "start", "tool": name}) + b"\n" for name in TOOLS
+}
+END_FRAMES: Dict[str, bytes] = {
+    name: orjson.dumps({"event": "end", "tool": name}) + b"\n" for name in TOOLS
+}
+
+# The tool registry is static, so the tools/list payload is encoded once.
+TOOLS_LIST_JSON = orjson.dumps(
+    {
+        "tools": [
+            {
+                "name": tool.name,
+                "description": tool.description,
+                "input_schema": tool.input_schema,
+                "output_schema": tool.output_schema,
+            }
+            for tool in TOOLS.values()
+        ]
+    }
+)
+
 
 # =====================================================
 # FastAPI app implementing MCP-like tools/list and tools/call
 # =====================================================
 
-app = FastAPI(title="Customer Support MCP Server")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    ensure_indexes()
+    yield
+
+
+app = FastAPI(
+    title="Customer Support MCP Server",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 
 @app.get("/health")
@@ -251,21 +482,11 @@ async def tools_list():
     Returns metadata that an MCP client (or MCP Inspector) can use
     to discover available tools and their input schemas.
     """
-    tools_payload = []
-    for tool in TOOLS.values():
-        tools_payload.append(
-            {
-                "name": tool.name,
-                "description": tool.description,
-                "input_schema": tool.input_schema,
-                "output_schema": tool.output_schema,
-            }
-        )
-    return {"tools": tools_payload}
+    return Response(TOOLS_LIST_JSON, media_type="application/json")
 
 
 @app.post("/tools/call")
-async def tools_call(body: Dict[str, Any]):
+async def tools_call(request: Request):
     """
     MCP-style tools/call endpoint.
 
@@ -276,10 +497,20 @@ async def tools_call(body: Dict[str, Any]):
       }
 
     Response is streamed as newline-delimited JSON chunks to
-    demonstrate a "streamable" HTTP protocol.
+    demonstrate a "streamable" HTTP protocol. Tools with a stream_func
+    emit one "chunk" event per row instead of a single "result" event.
     """
+    # Parsed by hand rather than declared as a Dict[str, Any] body, which
+    # would send it through Pydantic on every call.
+    try:
+        body = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Request body is not valid JSON.")
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="Request body must be a JSON object.")
+
     name = body.get("name")
-    if not name:
+    if not isinstance(name, str) or not name:
         raise HTTPException(status_code=400, detail="Missing 'name' in request body.")
 
     tool_def = TOOLS.get(name)
@@ -288,38 +519,60 @@ async def tools_call(body: Dict[str, Any]):
 
     arguments = body.get("arguments", {}) or {}
 
+    # Reject bad arguments up front with a 400 rather than opening a stream
+    # that would only carry an error event.
+    try:
+        validated = tool_def.validate(arguments)
+    except fastjsonschema.JsonSchemaException as e:
+        raise HTTPException(status_code=400, detail=e.message)
+
+    # SQLite calls block, so they are run in the threadpool rather than
+    # on the event loop.
     async def event_stream():
-        # Start event
-        start_msg = {"event": "start", "tool": name}
-        yield json.dumps(start_msg) + "\n"
+        yield START_FRAMES[name]
 
         try:
-            result = tool_def.func(**arguments)
-            result_msg = {
-                "event": "result",
-                "tool": name,
-                "output": result,
-            }
-            yield json.dumps(result_msg) + "\n"
+            if tool_def.stream_func is not None:
+                rows = tool_def.stream_func(**validated)
+                async for row in iterate_in_threadpool(rows):
+                    chunk_msg = {"event": "chunk", "tool": name, "row": row}
+                    yield orjson.dumps(chunk_msg) + b"\n"
+            else:
+                result = await run_in_threadpool(tool_def.func, **validated)
+                result_msg = {
+                    "event": "result",
+                    "tool": name,
+                    "output": result,
+                }
+                yield orjson.dumps(result_msg) + b"\n"
         except Exception as e:
             error_msg = {
                 "event": "error",
                 "tool": name,
                 "error": str(e),
             }
-            yield json.dumps(error_msg) + "\n"
+            yield orjson.dumps(error_msg) + b"\n"
 
-        # End event
-        end_msg = {"event": "end", "tool": name}
-        yield json.dumps(end_msg) + "\n"
+        yield END_FRAMES[name]
 
     return StreamingResponse(
         event_stream(),
-        media_type="application/json",
+        media_type="application/x-ndjson",
     )
 
 
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run("mcp_server:app", host="0.0.0.0", port=8000, reload=True)
+    # "auto" picks uvloop and httptools when they are installed (they come
+    # with uvicorn[standard], except uvloop on Windows). A single worker is
+    # kept on purpose: the read cache is per-process, so writes handled by
+    # one worker would not invalidate another worker's entries.
+    uvicorn.run(
+        "mcp_server:app",
+        host="0.0.0.0",
+        port=8000,
+        reload=True,
+        loop="auto",
+        http="auto",
+    )